@@ -1,28 +1,356 @@
 import streamlit as st
+import pandas as pd
 import ast
-import re
+import hashlib
 import tracemalloc
 import cProfile
-import io
+import collections
+import concurrent.futures
+import functools
+import heapq
+import marshal
+import multiprocessing
 import pstats
 import textwrap
+import threading
+import types
+
+try:
+    import resource
+except ImportError:  # POSIX only
+    resource = None
+
+# Limits applied to the child process that executes user code
+_CPU_LIMIT_SECONDS = 5
+_MEMORY_LIMIT_BYTES = 512 * 1024 * 1024
+_WALL_TIMEOUT_SECONDS = 10
+
+# Snippets longer than this are not executed unless the user opts in
+_LARGE_SNIPPET_CHARS = 10_000
+
+# Snippets remembered by each of the analyzer's caches
+_CACHE_SIZE = 32
+
+# Number of functions listed in the execution profile
+_PROFILE_ROWS = 10
+
+# Fork where available: Streamlit runs this file as a script, so the child
+# target cannot be re-imported by the spawn start method
+_MP_CONTEXT = multiprocessing.get_context(
+    'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+)
+
+# Loop node types and the suggestion attached to deep nesting of each
+_LOOP_SUGGESTIONS = {
+    ast.For: 'Consider refactoring with list comprehensions or generator expressions',
+    ast.AsyncFor: 'Consider refactoring with list comprehensions or generator expressions',
+    ast.While: 'Consider refactoring to reduce complexity'
+}
+
+
+# Findings are read-only and shared between analyses (and the static cache)
+_COMPLEX_LIST_COMP_FINDING = types.MappingProxyType({
+    'type': 'Complex List Comprehension',
+    'description': 'Multiple generators in list comprehension',
+    'suggestion': 'Consider breaking into separate comprehensions or using explicit loops'
+})
+
+_STRING_CONCAT_FINDING = types.MappingProxyType({
+    'type': 'String Concatenation',
+    'description': 'Multiple string concatenations detected',
+    'suggestion': 'Use str.join() or f-strings for better performance'
+})
+
+_APPEND_FINDING = types.MappingProxyType({
+    'type': 'Memory Usage',
+    'description': 'Repeated list.append() can be memory-intensive',
+    'suggestion': 'Consider using list comprehensions or generator expressions'
+})
+
+
+@functools.lru_cache(maxsize=None)
+def _nested_loop_finding(depth, loop_type):
+    """Shared finding for a loop of the given type nested `depth` deep"""
+    return types.MappingProxyType({
+        'type': 'Nested Loops',
+        'description': f'Deep nesting of {depth} loops detected',
+        'suggestion': _LOOP_SUGGESTIONS[loop_type]
+    })
+
+
+class _UnifiedVisitor(ast.NodeVisitor):
+    """Collect every static bottleneck in a single walk of the AST"""
+    max_recommended_depth = 2
+
+    def __init__(self):
+        self.findings = []
+        self.loop_depth = 0
+        self.function_stack = []
+        self.long_running_functions = []
+        self.has_string_concat = False
+        self.has_append = False
+
+    def visit(self, node):
+        # Walk with an explicit stack rather than recursion, so long chains
+        # such as 'a' + 'b' + ... cannot exhaust the interpreter stack.
+        # Handlers are looked up by node type directly instead of
+        # NodeVisitor's per-node 'visit_' + class name lookup; a handler may
+        # return a function to call once the node's subtree is done
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if not isinstance(item, ast.AST):
+                item(self)
+                continue
+            handler = self._dispatch.get(type(item))
+            if handler is not None:
+                on_exit = handler(self, item)
+                if on_exit is not None:
+                    stack.append(on_exit)
+            # Reversed so children are visited in source order
+            stack.extend(reversed(list(ast.iter_child_nodes(item))))
+
+    def _on_function(self, node):
+        self.function_stack.append(node)
+        return _UnifiedVisitor._leave_function
+
+    def _leave_function(self):
+        self.function_stack.pop()
+
+    def _on_loop(self, node):
+        # A loop inside a function marks the innermost enclosing function
+        if self.function_stack:
+            function = self.function_stack[-1]
+            if function not in self.long_running_functions:
+                self.long_running_functions.append(function)
+        self.loop_depth += 1
+        if self.loop_depth > self.max_recommended_depth:
+            self.findings.append(_nested_loop_finding(self.loop_depth, type(node)))
+        return _UnifiedVisitor._leave_loop
+
+    def _leave_loop(self):
+        self.loop_depth -= 1
+
+    def _on_listcomp(self, node):
+        if len(node.generators) > 1:
+            self.findings.append(_COMPLEX_LIST_COMP_FINDING)
+
+    def _on_binop(self, node):
+        if isinstance(node.op, ast.Add) and (_is_str_operand(node.left) or _is_str_operand(node.right)):
+            self.has_string_concat = True
+
+    def _on_augassign(self, node):
+        if isinstance(node.op, ast.Add) and _is_str_operand(node.value):
+            self.has_string_concat = True
+
+    def _on_call(self, node):
+        if isinstance(node.func, ast.Attribute) and node.func.attr == 'append':
+            self.has_append = True
+
+    _dispatch = {
+        ast.FunctionDef: _on_function,
+        ast.AsyncFunctionDef: _on_function,
+        ast.For: _on_loop,
+        ast.AsyncFor: _on_loop,
+        ast.While: _on_loop,
+        ast.ListComp: _on_listcomp,
+        ast.BinOp: _on_binop,
+        ast.AugAssign: _on_augassign,
+        ast.Call: _on_call
+    }
+
+
+def _is_str_operand(node):
+    """Whether the node is a string literal or an f-string"""
+    if isinstance(node, ast.JoinedStr):
+        return True
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+def _address_space_size():
+    """Bytes currently mapped by this process, 0 if unknown"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0
+    return pages * resource.getpagesize()
+
+
+def _set_limit(kind, value):
+    _, hard = resource.getrlimit(kind)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(kind, (value, value))
+
+
+def _limit_resources():
+    """Cap CPU time and address space of the current process (POSIX only)"""
+    if resource is None:
+        return
+    _set_limit(resource.RLIMIT_CPU, _CPU_LIMIT_SECONDS)
+    # A forked child inherits every mapping of the Streamlit process, so the
+    # memory budget is granted on top of what is already mapped
+    _set_limit(resource.RLIMIT_AS, _address_space_size() + _MEMORY_LIMIT_BYTES)
+
+
+def _run_instrumented_child(code_bytes, conn):
+    """Child process body: execute the code under tracemalloc and cProfile"""
+    try:
+        _limit_resources()
+        
+        # Tracing is never stopped: the child exits right after reporting.
+        # Only the allocating frame is recorded, and the set-up below is
+        # excluded by measuring against a baseline with a fresh peak
+        tracemalloc.start(1)
+        compiled = marshal.loads(code_bytes)
+        user_globals = {'__name__': '__main__'}
+        profiler = cProfile.Profile()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        
+        profiler.enable()
+        try:
+            exec(compiled, user_globals)
+        except SystemExit as e:
+            # sys.exit(main()) is the usual end of a guarded script
+            exit_code = e.code
+        else:
+            exit_code = None
+        finally:
+            profiler.disable()
+        # Read while user_globals is alive, so memory the snippet keeps
+        # referenced counts towards 'current'
+        current, peak = tracemalloc.get_traced_memory()
+        
+        # Ship the raw stats; the table is only built when displayed
+        profiler.create_stats()
+        
+        outcome = {
+            'memory_usage': {
+                'current': current - before,
+                'peak': peak - before
+            },
+            'execution_time': marshal.dumps(profiler.stats)
+        }
+        if isinstance(exit_code, str):  # sys.exit('message')
+            outcome['error'] = f'Snippet exited: {exit_code}'
+        elif exit_code not in (None, 0):
+            outcome['error'] = f'Snippet exited with code {exit_code}'
+        conn.send(outcome)
+    except BaseException as e:
+        conn.send({'error': str(e) or type(e).__name__})
+    finally:
+        conn.close()
+
+
+def _run_instrumented(compiled):
+    """
+    Execute compiled user code in a resource-limited child process
+    
+    Args:
+        compiled (code): Code object to execute
+    
+    Returns:
+        dict: 'memory_usage' and 'execution_time' (marshalled profiler
+            stats, see _profile_rows), or 'error'
+    """
+    parent_conn, child_conn = _MP_CONTEXT.Pipe(duplex=False)
+    process = _MP_CONTEXT.Process(
+        target=_run_instrumented_child,
+        args=(marshal.dumps(compiled), child_conn)
+    )
+    process.start()
+    child_conn.close()
+    
+    try:
+        if not parent_conn.poll(_WALL_TIMEOUT_SECONDS):
+            return {'error': f'Execution timed out after {_WALL_TIMEOUT_SECONDS} seconds'}
+        try:
+            return parent_conn.recv()
+        except EOFError:
+            # The child died without reporting: either killed by a signal
+            # (e.g. SIGXCPU on the CPU limit) or exited directly (os._exit)
+            process.join(1)
+            if process.exitcode is not None and process.exitcode < 0:
+                return {'error': f'Execution was killed by signal {-process.exitcode}, likely after exceeding its resource limits'}
+            return {'error': f'Execution exited early with code {process.exitcode}'}
+    finally:
+        parent_conn.close()
+        if process.is_alive():
+            process.terminate()
+            process.join(1)
+        # SIGTERM can be ignored by the snippet; SIGKILL cannot
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+
+def _content_key(code_snippet):
+    """Cache key identifying a snippet by its contents"""
+    return hashlib.blake2b(code_snippet.encode('utf-8'), digest_size=16).digest()
+
+
+def _cache_get(cache, key):
+    """Look up an LRU cache entry, marking it most recently used"""
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _cache_put(cache, key, value):
+    """Store an LRU cache entry, evicting the least recently used one"""
+    cache[key] = value
+    if len(cache) > _CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def _profile_rows(raw_stats, limit=_PROFILE_ROWS):
+    """
+    Top functions by internal time from marshalled profiler stats
+    
+    Args:
+        raw_stats (bytes): marshal.dumps() of cProfile.Profile.stats
+        limit (int): Number of functions to return
+    
+    Returns:
+        list: Dicts with 'function', 'calls', 'tottime' and 'cumtime'
+    """
+    stats = marshal.loads(raw_stats)
+    top = heapq.nlargest(limit, stats.items(), key=lambda item: item[1][2])
+    return [
+        {
+            'function': pstats.func_std_string(func),
+            'calls': calls,
+            'tottime': tottime,
+            'cumtime': cumtime
+        }
+        for func, (_, calls, tottime, cumtime, _) in top
+    ]
+
 
 class PerformanceAnalyzer:
+    __slots__ = ('_ast_cache', '_code_cache', '_static_cache', '_lock')
+    
     def __init__(self):
-        self.bottleneck_rules = [
-            self._check_nested_loops,
-            self._check_inefficient_string_operations,
-            self._check_unnecessary_list_comprehensions,
-            self._analyze_memory_usage,
-            self._profile_execution_time
-        ]
+        # Parsed trees, code objects and static findings keyed by the
+        # content hash of the snippet, so re-analyzing unchanged input skips
+        # ast.parse, the AST walk and compile
+        self._ast_cache = collections.OrderedDict()
+        self._code_cache = collections.OrderedDict()
+        self._static_cache = collections.OrderedDict()
+        # One analyzer is shared by every Streamlit session (see get_analyzer)
+        self._lock = threading.Lock()
     
-    def analyze_code(self, code_snippet):
+    def analyze_code(self, code_snippet, dynamic=True):
         """
         Comprehensive code performance analysis
         
         Args:
             code_snippet (str): Python code to analyze
+            dynamic (bool): Execute the code to measure memory and time;
+                when False only the static checks run
         
         Returns:
             dict: Performance analysis results
@@ -35,140 +363,91 @@ class PerformanceAnalyzer:
         }
         
         try:
-            # Parse the AST
-            tree = ast.parse(code_snippet)
-            
-            # Run bottleneck detection rules
-            for rule in self.bottleneck_rules:
-                rule_results = rule(tree, code_snippet)
-                if rule_results:
-                    results['bottlenecks'].extend(rule_results)
-            
-            # Measure memory usage
-            tracemalloc.start()
-            exec(code_snippet)
-            current, peak = tracemalloc.get_traced_memory()
-            tracemalloc.stop()
+            key = _content_key(code_snippet)
             
-            results['memory_usage'] = {
-                'current': current,
-                'peak': peak
-            }
-            
-            # Profile execution time
-            profiler = cProfile.Profile()
-            profiler.enable()
-            exec(code_snippet)
-            profiler.disable()
-            
-            # Capture profiler stats
-            stats_stream = io.StringIO()
-            stats = pstats.Stats(profiler, stream=stats_stream)
-            stats.sort_stats(pstats.SortKey.TIME)
-            stats.print_stats(10)
-            
-            results['execution_time'] = stats_stream.getvalue()
+            if dynamic:
+                # Parse up front so both threads share the cached tree
+                self._parse(key, code_snippet)
+                
+                # Run bottleneck detection on a worker thread while the main
+                # thread waits on the sandboxed run measuring memory and time
+                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                    static_future = executor.submit(self._static_analyze, key, code_snippet)
+                    try:
+                        compiled = self._compile(key, code_snippet)
+                    except (SyntaxError, RecursionError) as e:
+                        # Parses but does not compile (e.g. 'return' outside
+                        # a function, or an expression nested too deeply for
+                        # the compiler): keep the static findings
+                        results['error'] = str(e)
+                    else:
+                        results.update(_run_instrumented(compiled))
+                    results['bottlenecks'].extend(static_future.result())
+            else:
+                results['bottlenecks'].extend(self._static_analyze(key, code_snippet))
             
         except Exception as e:
             results['error'] = str(e)
         
         return results
     
-    def _check_nested_loops(self, tree, code_snippet):
-        """Detect potentially inefficient nested loops"""
-        nested_loops = []
-        loop_depth = 0
-        max_recommended_depth = 2
-        
-        class LoopVisitor(ast.NodeVisitor):
-            def visit_For(self, node):
-                nonlocal loop_depth
-                loop_depth += 1
-                if loop_depth > max_recommended_depth:
-                    nested_loops.append({
-                        'type': 'Nested Loops',
-                        'description': f'Deep nesting of {loop_depth} loops detected',
-                        'suggestion': 'Consider refactoring with list comprehensions or generator expressions'
-                    })
-                self.generic_visit(node)
-                loop_depth -= 1
-            
-            def visit_While(self, node):
-                nonlocal loop_depth
-                loop_depth += 1
-                if loop_depth > max_recommended_depth:
-                    nested_loops.append({
-                        'type': 'Nested Loops',
-                        'description': f'Deep nesting of {loop_depth} loops detected',
-                        'suggestion': 'Consider refactoring to reduce complexity'
-                    })
-                self.generic_visit(node)
-                loop_depth -= 1
-        
-        LoopVisitor().visit(tree)
-        return nested_loops
+    def _cached(self, cache, key, build):
+        """Return the cached value for key, calling build() on a miss"""
+        with self._lock:
+            value = _cache_get(cache, key)
+        if value is None:
+            value = build()
+            with self._lock:
+                _cache_put(cache, key, value)
+        return value
     
-    def _check_inefficient_string_operations(self, tree, code_snippet):
-        """Detect inefficient string concatenation"""
-        inefficient_ops = []
-        
-        if '+' in code_snippet and 'str' in code_snippet:
-            inefficient_ops.append({
-                'type': 'String Concatenation',
-                'description': 'Multiple string concatenations detected',
-                'suggestion': 'Use str.join() or f-strings for better performance'
-            })
-        
-        return inefficient_ops
+    def _parse(self, key, code_snippet):
+        """Parse the snippet, reusing the tree from a previous identical input"""
+        return self._cached(
+            self._ast_cache, key,
+            lambda: ast.parse(code_snippet, type_comments=False)
+        )
     
-    def _check_unnecessary_list_comprehensions(self, tree, code_snippet):
-        """Check for potentially unnecessary list comprehensions"""
-        unnecessary_comps = []
-        
-        class CompVisitor(ast.NodeVisitor):
-            def visit_ListComp(self, node):
-                if len(node.generators) > 1:
-                    unnecessary_comps.append({
-                        'type': 'Complex List Comprehension',
-                        'description': 'Multiple generators in list comprehension',
-                        'suggestion': 'Consider breaking into separate comprehensions or using explicit loops'
-                    })
-                self.generic_visit(node)
-        
-        CompVisitor().visit(tree)
-        return unnecessary_comps
+    def _compile(self, key, code_snippet):
+        """Compile the parsed tree, reusing the code object for identical input"""
+        return self._cached(
+            self._code_cache, key,
+            lambda: compile(self._parse(key, code_snippet), '<user>', 'exec')
+        )
     
-    def _analyze_memory_usage(self, tree, code_snippet):
-        """Additional memory usage analysis"""
-        memory_hints = []
-        
-        if 'append' in code_snippet:
-            memory_hints.append({
-                'type': 'Memory Usage',
-                'description': 'Repeated list.append() can be memory-intensive',
-                'suggestion': 'Consider using list comprehensions or generator expressions'
-            })
-        
-        return memory_hints
+    def _static_analyze(self, key, code_snippet):
+        """Static findings for the snippet, reused for identical input"""
+        return self._cached(
+            self._static_cache, key,
+            lambda: tuple(self._run_static_rules(self._parse(key, code_snippet)))
+        )
     
-    def _profile_execution_time(self, tree, code_snippet):
-        """Basic execution time profiling"""
-        time_hints = []
+    def _run_static_rules(self, tree):
+        """Walk the AST once and turn the collected facts into findings"""
+        visitor = _UnifiedVisitor()
+        visitor.visit(tree)
+        bottlenecks = visitor.findings
+        
+        if visitor.has_string_concat:
+            bottlenecks.append(_STRING_CONCAT_FINDING)
         
-        complex_function_patterns = [
-            r'def\s+\w+\s*\(.*\):\s*(?:.*\n)*?\s*for\s+',  # Functions with loops
-            r'def\s+\w+\s*\(.*\):\s*(?:.*\n)*?\s*while\s+'   # Functions with while loops
-        ]
+        if visitor.has_append:
+            bottlenecks.append(_APPEND_FINDING)
         
-        for pattern in complex_function_patterns:
-            if re.search(pattern, code_snippet, re.MULTILINE):
-                time_hints.append({
-                    'type': 'Execution Time',
-                    'description': 'Potential long-running function detected',
-                    'suggestion': 'Profile and optimize complex functions'
-                })
+        # Functions containing for / while loops
+        for function in visitor.long_running_functions:
+            bottlenecks.append(types.MappingProxyType({
+                'type': 'Execution Time',
+                'description': f"Potential long-running function '{function.name}' detected (line {function.lineno})",
+                'suggestion': 'Profile and optimize complex functions'
+            }))
         
-        return time_hints
+        return bottlenecks
+
+@st.cache_resource
+def get_analyzer():
+    """Analyzer instance shared by all Streamlit sessions"""
+    return PerformanceAnalyzer()
 
 def main():
     # Set up the Streamlit app
@@ -188,8 +467,8 @@ def main():
     - Receive optimization suggestions
     """)
     
-    # Initialize the performance analyzer
-    analyzer = PerformanceAnalyzer()
+    # Reuse the performance analyzer (and its caches) across reruns
+    analyzer = get_analyzer()
     
     # Sidebar for file upload
     st.sidebar.header("Code Input")
@@ -213,6 +492,16 @@ def main():
         if uploaded_file is not None:
             code_snippet = uploaded_file.getvalue().decode("utf-8")
     
+    # Normalize indentation once, so analysis and preview share the result
+    code_snippet = textwrap.dedent(code_snippet)
+    
+    # Executing the code dominates analysis time, so it is opt-in for
+    # large snippets
+    measure_runtime = st.sidebar.checkbox(
+        "Measure runtime (executes code)",
+        value=len(code_snippet) <= _LARGE_SNIPPET_CHARS
+    )
+    
     # Analyze button
     if st.sidebar.button("Analyze Performance"):
         if not code_snippet.strip():
@@ -221,18 +510,24 @@ def main():
             # Perform analysis
             with st.spinner('Analyzing your code...'):
                 try:
-                    results = analyzer.analyze_code(code_snippet)
+                    results = analyzer.analyze_code(code_snippet, dynamic=measure_runtime)
                     
                     # Display results
                     st.header("Analysis Results")
                     
+                    if results.get('error'):
+                        st.error(f"An error occurred during analysis: {results['error']}")
+                    
                     # Bottlenecks
                     if results.get('bottlenecks'):
                         st.subheader("🚨 Potential Bottlenecks")
-                        for bottleneck in results['bottlenecks']:
-                            st.warning(f"**{bottleneck['type']}**")
-                            st.write(f"Description: {bottleneck['description']}")
-                            st.info(f"Suggestion: {bottleneck['suggestion']}")
+                        st.dataframe(
+                            pd.DataFrame(
+                                [dict(b) for b in results['bottlenecks']],
+                                columns=['type', 'description', 'suggestion']
+                            ),
+                            hide_index=True
+                        )
                     
                     # Memory Usage
                     if results.get('memory_usage'):
@@ -251,12 +546,15 @@ def main():
                     
                     # Execution Time Profile
                     if results.get('execution_time'):
-                        st.subheader("⏱️ Execution Profile")
-                        st.code(results['execution_time'], language='text')
+                        with st.expander("⏱️ Execution Profile"):
+                            st.dataframe(
+                                _profile_rows(results['execution_time']),
+                                hide_index=True
+                            )
                     
                     # Original Code Preview
                     st.subheader("📝 Original Code")
-                    st.code(textwrap.dedent(code_snippet), language='python')
+                    st.code(code_snippet, language='python', line_numbers=True)
                 
                 except Exception as e:
                     st.error(f"An error occurred during analysis: {str(e)}")
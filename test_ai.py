@@ -0,0 +1,18 @@
+from AI import PerformanceAnalyzer
+
+
+def test_long_string_concatenation_chain():
+    # A few hundred '+' terms used to exhaust the recursion limit in the
+    # AST walk and drop every finding
+    code_snippet = (
+        "s = " + " + ".join(["'x'"] * 1000) + "\n"
+        "for a in range(2):\n"
+        "    for b in range(2):\n"
+        "        for c in range(2):\n"
+        "            pass\n"
+    )
+    
+    results = PerformanceAnalyzer().analyze_code(code_snippet, dynamic=False)
+    
+    assert 'error' not in results
+    assert [b['type'] for b in results['bottlenecks']] == ['Nested Loops', 'String Concatenation']